@@ -1,7 +1,8 @@
 """
 Response formatter — turns raw tool output into friendly, readable answers.
 """
-from ollama_client import chat
+import os
+from agent.llm_cache import cached_chat, cached_chat_stream
 
 FORMATTER_SYSTEM_PROMPT = """You are a friendly Ops Assistant helping a non-technical user.
 You are given raw output from a server tool. Your job is to:
@@ -13,11 +14,31 @@ You are given raw output from a server tool. Your job is to:
 6. If there's an error or permission issue, explain it simply and suggest a fix.
 7. Keep answers concise — no more than 150 words unless log analysis requires more."""
 
+# Built once; the Ollama client only reads message dicts
+_FORMATTER_SYS_MSG = {"role": "system", "content": FORMATTER_SYSTEM_PROMPT}
 
-def format_tool_result(tool_name: str, tool_output: str, user_message: str) -> str:
-    """Ask the LLM to turn raw tool output into a friendly response."""
-    prompt = [
-        {"role": "system", "content": FORMATTER_SYSTEM_PROMPT},
+# Set USE_LLM_FORMATTER=1 to send every tool result through the model.
+USE_LLM_FORMATTER = os.getenv("USE_LLM_FORMATTER", "0") == "1"
+# Raw output longer than this is summarized by the model even if templated
+LLM_FORMAT_THRESHOLD = 4000
+
+# Tools whose output is already readable get a template instead of an LLM call.
+# Nginx logs aren't listed: those benefit from summarization.
+_TEMPLATES = {
+    "get_disk_free": "**Disk usage**\n```\n{}\n```",
+    "get_ram_usage": "**Memory usage**\n```\n{}\n```",
+    "get_cpu_usage": "**CPU usage:** {}",
+    "get_uptime": "**Uptime**\n```\n{}\n```",
+    "get_system_snapshot": "**System snapshot**\n```\n{}\n```",
+    "list_workspace_files": "**Workspace files**\n```\n{}\n```",
+    "read_text_file": "**File contents**\n```\n{}\n```",
+    "create_text_file": "{}",
+}
+
+
+def _build_prompt(tool_name: str, tool_output: str, user_message: str) -> list[dict]:
+    return [
+        _FORMATTER_SYS_MSG,
         {
             "role": "user",
             "content": (
@@ -28,10 +49,64 @@ def format_tool_result(tool_name: str, tool_output: str, user_message: str) -> s
             ),
         },
     ]
+
+
+def _raw_result(tool_output: str) -> str:
+    return f"Here's the raw result:\n\n```\n{tool_output}\n```"
+
+
+def _template_result(tool_name: str, tool_output: str) -> str | None:
+    """Templated answer for cheap tools, or None if the LLM should format it."""
+    template = _TEMPLATES.get(tool_name)
+    if template is None or USE_LLM_FORMATTER or len(tool_output) > LLM_FORMAT_THRESHOLD:
+        return None
+    # Errors still go to the model, which explains them and suggests a fix
+    if tool_output.startswith(("Error", "Tool error")):
+        return None
+    # read_text_file status messages are already plain sentences, not file contents
+    if tool_name == "read_text_file" and (
+        tool_output == "(File is empty)"
+        or (tool_output.startswith("File '") and tool_output.endswith("' not found in workspace."))
+    ):
+        return tool_output
+    return template.format(tool_output)
+
+
+def format_tool_result(tool_name: str, tool_output: str, user_message: str) -> str:
+    """Ask the LLM to turn raw tool output into a friendly response."""
+    templated = _template_result(tool_name, tool_output)
+    if templated is not None:
+        return templated
+
+    prompt = _build_prompt(tool_name, tool_output, user_message)
+    try:
+        # Namespace by tool and exact output so only the phrasing can vary
+        return cached_chat(prompt, temperature=0.3, namespace=f"{tool_name}:{hash(tool_output)}") or _raw_result(tool_output)
+    except Exception:
+        return _raw_result(tool_output)
+
+
+def format_tool_result_stream(tool_name: str, tool_output: str, user_message: str):
+    """
+    Like format_tool_result, but yields the response as the model generates it.
+    Raises RuntimeError if the model fails after part of the answer was sent.
+    """
+    templated = _template_result(tool_name, tool_output)
+    if templated is not None:
+        yield templated
+        return
+
+    prompt = _build_prompt(tool_name, tool_output, user_message)
+    started = False
     try:
-        return chat(prompt, temperature=0.3)
+        for chunk in cached_chat_stream(prompt, temperature=0.3, namespace=f"{tool_name}:{hash(tool_output)}"):
+            started = started or bool(chunk)
+            yield chunk
     except Exception as e:
-        return f"Here's the raw result:\n\n```\n{tool_output}\n```"
+        if started:
+            raise RuntimeError(f"The response was interrupted: {e}") from e
+    if not started:
+        yield _raw_result(tool_output)
 
 
 def format_clarification(question: str) -> str:
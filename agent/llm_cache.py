@@ -0,0 +1,109 @@
+"""
+Semantic response cache — reuses completions for near-duplicate prompts.
+"""
+import math
+import os
+import threading
+import time
+from cachetools import TTLCache
+from ollama_client import chat, chat_stream, embed, OLLAMA_EMBED_MODEL
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.92))
+SEMANTIC_CACHE_TTL = int(os.getenv("SEMANTIC_CACHE_TTL", 1800))
+SEMANTIC_CACHE_SIZE = 256  # entries kept per namespace
+SEMANTIC_CACHE_NAMESPACES = 512  # namespaces kept; idle ones expire with their entries
+MAX_CACHEABLE_TEMPERATURE = 0.3
+
+_lock = threading.Lock()
+# namespace -> [(expires_at, unit embedding, completion)]
+_entries: TTLCache = TTLCache(maxsize=SEMANTIC_CACHE_NAMESPACES, ttl=SEMANTIC_CACHE_TTL)
+# After a failed embeddings call (model not pulled, Ollama restarting) the
+# cache is skipped for a while instead of adding a failing request to every call
+EMBED_RETRY_AFTER = 60
+_embed_retry_at = 0.0
+
+
+def _normalize(vec: list[float]) -> list[float]:
+    norm = math.sqrt(sum(x * x for x in vec))
+    return [x / norm for x in vec] if norm else vec
+
+
+def _lookup(namespace: str, vec: list[float]) -> str | None:
+    now = time.monotonic()
+    with _lock:
+        entries = [e for e in _entries.get(namespace, ()) if e[0] > now]
+        if entries:
+            _entries[namespace] = entries
+        else:
+            _entries.pop(namespace, None)
+        best_score, best = 0.0, None
+        for _, cached_vec, completion in entries:
+            score = sum(a * b for a, b in zip(vec, cached_vec))
+            if score > best_score:
+                best_score, best = score, completion
+    return best if best_score >= SEMANTIC_CACHE_THRESHOLD else None
+
+
+def _store(namespace: str, vec: list[float], completion: str) -> None:
+    with _lock:
+        entries = _entries.get(namespace, [])
+        entries.append((time.monotonic() + SEMANTIC_CACHE_TTL, vec, completion))
+        del entries[:-SEMANTIC_CACHE_SIZE]
+        _entries[namespace] = entries
+
+
+def _embed_prompt(messages: list, temperature: float) -> list[float] | None:
+    """
+    Unit embedding for a cacheable prompt, or None when caching doesn't apply.
+    Only the last user turn is embedded; a long shared system prompt would
+    otherwise make unrelated requests look alike.
+    """
+    global _embed_retry_at
+    if not OLLAMA_EMBED_MODEL or temperature > MAX_CACHEABLE_TEMPERATURE:
+        return None
+    if time.monotonic() < _embed_retry_at:
+        return None
+    text = next((m["content"] for m in reversed(messages) if m["role"] == "user"), "")
+    if not text:
+        return None
+    try:
+        return _normalize(embed(text))
+    except Exception:
+        _embed_retry_at = time.monotonic() + EMBED_RETRY_AFTER
+        return None
+
+
+def cached_chat(messages: list, temperature: float = 0.1, namespace: str = "default") -> str:
+    """
+    Like chat(), but returns a cached completion when a previous prompt in the
+    same namespace is semantically close enough. Only low-temperature calls are
+    cached; if embeddings are unavailable this falls through to chat().
+    """
+    vec = _embed_prompt(messages, temperature)
+    if vec is None:
+        return chat(messages, temperature=temperature)
+
+    hit = _lookup(namespace, vec)
+    if hit is not None:
+        return hit
+
+    completion = chat(messages, temperature=temperature)
+    _store(namespace, vec, completion)
+    return completion
+
+
+def cached_chat_stream(messages: list, temperature: float = 0.1, namespace: str = "default"):
+    """Streaming counterpart of cached_chat(); a hit is yielded as one chunk."""
+    vec = _embed_prompt(messages, temperature)
+    if vec is not None:
+        hit = _lookup(namespace, vec)
+        if hit is not None:
+            yield hit
+            return
+
+    parts = []
+    for chunk in chat_stream(messages, temperature=temperature):
+        parts.append(chunk)
+        yield chunk
+    if vec is not None:
+        _store(namespace, vec, "".join(parts))
@@ -1,15 +1,23 @@
 """
 Memory manager — loads context and handles summarization.
 """
+import io
 import os
 from ollama_client import chat
 
 CONTEXT_MESSAGES = int(os.getenv("CONTEXT_MESSAGES", 20))
 SUMMARIZE_THRESHOLD = int(os.getenv("SUMMARIZE_THRESHOLD", 20))
+SUMMARY_INPUT_BYTES = 4096  # history sent to the summarizer, most recent first
+SUMMARY_KEEP_RECENT = 10  # newest messages left out of the summary
+SUMMARY_INPUT_MESSAGES = 64  # older messages read per summary; the byte budget trims further
+SUMMARY_LINE_CHARS = 300
+SUMMARY_MAX_TOKENS = 256
 
 SUMMARIZER_PROMPT = """You are a concise summarizer. Summarize the following chat history into
 2-4 bullet points capturing the key facts and actions taken. Be brief."""
 
+_SUMMARIZER_SYS_MSG = {"role": "system", "content": SUMMARIZER_PROMPT}
+
 
 def build_context(conversation, messages: list) -> list[dict]:
     """
@@ -30,30 +38,38 @@ def build_context(conversation, messages: list) -> list[dict]:
     return context
 
 
-def maybe_summarize(conversation, messages: list, db_session) -> None:
+def maybe_summarize(conversation, message_count: int, older_messages: list, db_session) -> None:
     """
     If message count exceeds threshold, summarize older messages
     and store in conversation.summary.
+    older_messages: up to SUMMARY_INPUT_MESSAGES messages preceding the last
+    SUMMARY_KEEP_RECENT, newest first (anything with .role and .content).
     """
-    if len(messages) < SUMMARIZE_THRESHOLD:
+    if message_count < SUMMARIZE_THRESHOLD or not older_messages:
         return
 
-    # Only summarize messages older than the last 10
-    to_summarize = messages[:-10]
-    if not to_summarize:
-        return
+    # Keep the newest lines that fit the byte budget, then restore order
+    lines = []
+    used = 0
+    for m in older_messages:
+        line = f"{m.role.upper()}: {m.content[:SUMMARY_LINE_CHARS]}\n"
+        used += len(line.encode("utf-8"))
+        if used > SUMMARY_INPUT_BYTES and lines:
+            break
+        lines.append(line)
 
-    history_text = "\n".join(
-        f"{m.role.upper()}: {m.content[:300]}" for m in to_summarize
-    )
+    buf = io.StringIO()
+    for line in reversed(lines):
+        buf.write(line)
+    history_text = buf.getvalue().rstrip("\n")
 
     prompt = [
-        {"role": "system", "content": SUMMARIZER_PROMPT},
+        _SUMMARIZER_SYS_MSG,
         {"role": "user", "content": history_text},
     ]
 
     try:
-        summary = chat(prompt, temperature=0.2)
+        summary = chat(prompt, temperature=0, num_predict=SUMMARY_MAX_TOKENS)
         conversation.summary = summary
         db_session.commit()
     except Exception:
@@ -1,11 +1,13 @@
 """
 Safety policy layer — validates tool decisions before execution.
 """
+import re
 
+# Base forms; inflections (deleted, stopping, wipes, ...) are matched by _DESTRUCTIVE_RE
 DESTRUCTIVE_KEYWORDS = [
-    "delete", "remove", "rm", "drop", "wipe", "format",
-    "stop", "restart", "reboot", "shutdown", "kill", "pkill",
-    "clean", "purge", "uninstall",
+    "delete", "deletion", "remove", "removal", "rm", "rmdir", "drop", "wipe",
+    "format", "erase", "stop", "restart", "reboot", "shutdown", "shut down",
+    "kill", "pkill", "killall", "clean", "cleanup", "purge", "uninstall",
 ]
 
 FORBIDDEN_PATHS = [
@@ -13,11 +15,49 @@ FORBIDDEN_PATHS = [
     "/root", "/etc/passwd", "authorized_keys", "known_hosts",
 ]
 
+_VOWELS = "aeiou"
+_SUFFIX = "(?:s|es|d|ed|ing)?"
+# Derived stems aren't words on their own ("wip", "eras"), so need a suffix
+_STEM_SUFFIX = "(?:ed|ing)"
+
+
+def _stems(word: str) -> list[str]:
+    """The stems a word's -ed/-ing forms use (wipe -> wip, stop -> stopp), if any."""
+    stems = []
+    if word.endswith("e"):
+        stems.append(word[:-1])
+    elif (
+        len(word) >= 3
+        and word[-1] not in _VOWELS + "wxy"
+        and word[-2] in _VOWELS
+        and word[-3] not in _VOWELS
+    ):
+        stems.append(word + word[-1])
+    return stems
+
+
+def _inflected(keyword: str) -> str:
+    """Regex for a keyword and its inflections; in phrases the first word is inflected."""
+    verb, _, rest = keyword.partition(" ")
+    tail = r"\s+" + r"\s+".join(map(re.escape, rest.split())) if rest else ""
+    forms = [re.escape(verb) + _SUFFIX]
+    forms += [re.escape(stem) + _STEM_SUFFIX for stem in _stems(verb)]
+    return "|".join(form + tail for form in forms)
+
+
+# Exact words are a set lookup; the regex catches suffixed forms and phrases
+_DESTRUCTIVE = frozenset(DESTRUCTIVE_KEYWORDS)
+_DESTRUCTIVE_RE = re.compile(r"\b(?:%s)\b" % "|".join(map(_inflected, DESTRUCTIVE_KEYWORDS)))
+_WORD_RE = re.compile(r"\b\w+\b")
+# One alternation compiled once: a single scan instead of one search per path
+_FORBIDDEN_RE = re.compile("|".join(map(re.escape, FORBIDDEN_PATHS)))
+
 ALLOWED_TOOLS = {
     "get_disk_free",
     "get_ram_usage",
     "get_cpu_usage",
     "get_uptime",
+    "get_system_snapshot",
     "tail_nginx_error",
     "tail_nginx_access",
     "list_workspace_files",
@@ -32,10 +72,17 @@ class PolicyViolation(Exception):
     pass
 
 
-def check(action: dict, user_message: str = "") -> dict:
+def check(
+    action: dict,
+    user_message: str = "",
+    msg_lower: str | None = None,
+    tokens: frozenset[str] | None = None,
+) -> dict:
     """
     Validate the action dict from the router.
     Returns the action unchanged if safe, raises PolicyViolation otherwise.
+    msg_lower / tokens: the lowercased message and its word set, if the
+    caller already computed them.
     """
     tool = action.get("action", "")
 
@@ -47,8 +94,12 @@ def check(action: dict, user_message: str = "") -> dict:
         }
 
     # Check user message for destructive intent
-    msg_lower = user_message.lower()
-    if any(kw in msg_lower for kw in DESTRUCTIVE_KEYWORDS) and tool not in ("ask_clarification", "refuse"):
+    if msg_lower is None:
+        msg_lower = user_message.lower()
+    if tokens is None:
+        tokens = frozenset(_WORD_RE.findall(msg_lower))
+    destructive = not _DESTRUCTIVE.isdisjoint(tokens) or _DESTRUCTIVE_RE.search(msg_lower) is not None
+    if destructive and tool not in ("ask_clarification", "refuse"):
         return {
             "action": "refuse",
             "reason": "Destructive actions (delete, stop, restart, remove, etc.) are disabled for safety.",
@@ -57,12 +108,11 @@ def check(action: dict, user_message: str = "") -> dict:
     # Check for forbidden path access in file tools
     if tool in ("create_text_file", "read_text_file"):
         filename = action.get("filename", "")
-        for forbidden in FORBIDDEN_PATHS:
-            if forbidden in filename or ".." in filename or filename.startswith("/"):
-                return {
-                    "action": "refuse",
-                    "reason": "Access to that path is not allowed for security reasons.",
-                }
+        if _FORBIDDEN_RE.search(filename) or ".." in filename or filename.startswith("/"):
+            return {
+                "action": "refuse",
+                "reason": "Access to that path is not allowed for security reasons.",
+            }
 
     # Check lines parameter bounds
     if tool in ("tail_nginx_error", "tail_nginx_access"):
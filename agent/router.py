@@ -3,13 +3,14 @@ Router — uses Ollama to parse user intent into a strict JSON tool action.
 """
 import json
 import re
+from functools import lru_cache
 from ollama_client import chat
 
 ROUTER_SYSTEM_PROMPT = """You are an action router for a safe Ops Assistant. The user is non-technical.
 You MUST output ONLY valid JSON and nothing else. No explanation, no markdown, no text before or after.
 
 Choose exactly one action from:
-get_disk_free, get_ram_usage, get_cpu_usage, get_uptime,
+get_disk_free, get_ram_usage, get_cpu_usage, get_uptime, get_system_snapshot,
 tail_nginx_error, tail_nginx_access,
 list_workspace_files, create_text_file, read_text_file,
 ask_clarification, refuse
@@ -22,12 +23,14 @@ Rules:
 - If user asks for delete/remove/stop/restart/kill/format/cleanup: output refuse.
 - Never allow paths outside workdir. Never allow secrets, SSH keys, .env files.
 - For nginx log questions, use lines=50 by default unless user specifies.
+- For broad "how is the server doing" / health / status questions: get_system_snapshot.
 
 Output examples (JSON only):
 {"action":"get_disk_free"}
 {"action":"get_ram_usage"}
 {"action":"get_cpu_usage"}
 {"action":"get_uptime"}
+{"action":"get_system_snapshot"}
 {"action":"tail_nginx_error","lines":50}
 {"action":"tail_nginx_access","lines":80}
 {"action":"list_workspace_files"}
@@ -37,9 +40,22 @@ Output examples (JSON only):
 {"action":"refuse","reason":"Destructive actions are disabled for safety."}"""
 
 
-def _fallback_action(text: str) -> dict | None:
-    normalized = text.lower()
-    tokens = set(re.findall(r"\b\w+\b", normalized))
+_WORD_RE = re.compile(r"\b\w+\b")
+_JSON_RE = re.compile(r"\{.*?\}", re.DOTALL)
+# Built once; the Ollama client only reads message dicts
+_ROUTER_SYS_MSG = {"role": "system", "content": ROUTER_SYSTEM_PROMPT}
+
+
+@lru_cache(maxsize=1024)
+def tokenize(normalized: str) -> frozenset[str]:
+    """Return the set of words in already-lowercased text. Pure, so safe to memoize."""
+    return frozenset(_WORD_RE.findall(normalized))
+
+
+def _fallback_action(text: str, normalized: str | None = None) -> dict | None:
+    if normalized is None:
+        normalized = text.lower()
+    tokens = tokenize(normalized)
 
     if "nginx" in normalized and "error" in normalized:
         return {"action": "tail_nginx_error", "lines": 50}
@@ -55,6 +71,10 @@ def _fallback_action(text: str) -> dict | None:
     if "uptime" in tokens or "running" in tokens:
         return {"action": "get_uptime"}
 
+    # After the single-metric checks so "cpu status" still means the CPU
+    if "health" in tokens or "status" in tokens or "overview" in tokens:
+        return {"action": "get_system_snapshot"}
+
     if "workspace" in normalized and ("files" in tokens or "list" in tokens):
         return {"action": "list_workspace_files"}
 
@@ -75,7 +95,7 @@ def _extract_json(text: str) -> dict:
     except json.JSONDecodeError:
         pass
     # Try to find JSON block
-    match = re.search(r'\{.*?\}', text, re.DOTALL)
+    match = _JSON_RE.search(text)
     if match:
         try:
             return json.loads(match.group())
@@ -85,24 +105,26 @@ def _extract_json(text: str) -> dict:
     return {"action": "ask_clarification", "question": "I didn't understand that. Could you rephrase?"}
 
 
-def route(user_message: str, history: list[dict] | None = None) -> dict:
+def route(user_message: str, history: list[dict] | None = None, msg_lower: str | None = None) -> dict:
     """
     Given user message and optional history, return a tool action dict.
     history: list of {"role": "user"/"assistant", "content": "..."}
+    msg_lower: user_message.lower(), if the caller already computed it.
     """
-    messages = [{"role": "system", "content": ROUTER_SYSTEM_PROMPT}]
+    # Cheap keyword rules handle most ops questions without an LLM call
+    fallback = _fallback_action(user_message, msg_lower)
+    if fallback:
+        return fallback
+
+    messages = [_ROUTER_SYS_MSG]
 
-    # Add recent history for context (last 6 turns)
+    # Add recent history for context (last 6 turns); the dicts are only read
     if history:
-        for h in history[-6:]:
-            if h["role"] in ("user", "assistant"):
-                messages.append({"role": h["role"], "content": h["content"]})
+        messages.extend(h for h in history[-6:] if h["role"] in ("user", "assistant"))
 
     messages.append({"role": "user", "content": user_message})
 
-    fallback = _fallback_action(user_message)
-    if fallback:
-        return fallback
-
+    # Exact-prompt cache only: near-identical requests can need different
+    # parameters (filename, content), so semantic matches aren't safe here
     raw = chat(messages, temperature=0.0)
     return _extract_json(raw)
@@ -2,10 +2,15 @@
 SSH tool runner — all commands run on the remote PC via paramiko.
 Only allowlisted, safe commands are executed.
 """
+import io
 import os
 import json
+import atexit
 import posixpath
+import threading
+from contextlib import contextmanager
 import paramiko
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,30 +22,171 @@ SSH_KEY_PATH = os.getenv("SSH_KEY_PATH", "/home/nexapp-server/.ssh/id_ed25519")
 SSH_WORKDIR = os.getenv("SSH_WORKDIR", "/home/nexapp-server/ops_workspace")
 
 
-def _get_client() -> paramiko.SSHClient:
-    client = paramiko.SSHClient()
-    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-    client.connect(
-        hostname=SSH_HOST,
-        port=SSH_PORT,
-        username=SSH_USER,
-        key_filename=SSH_KEY_PATH,
-        timeout=15,
-    )
-    return client
+SSH_KEEPALIVE = 30
+# Larger than paramiko's defaults so SFTP transfers need fewer window updates
+SSH_WINDOW_SIZE = 4 * 1024 * 1024
+SSH_MAX_PACKET_SIZE = 32768
+_BATCH_SEP = "===SEP==="
+
+# Slow-changing tool outputs are reused for a few seconds so quick re-asks
+# don't go back over SSH. File contents are cached longer, keyed by mtime.
+TOOL_CACHE_TTL = int(os.getenv("TOOL_CACHE_TTL", 10))
+FILE_CACHE_TTL = int(os.getenv("FILE_CACHE_TTL", 300))
+CACHED_TOOLS = {
+    "get_disk_free",
+    "get_ram_usage",
+    "get_cpu_usage",
+    "get_uptime",
+    "get_system_snapshot",
+    "list_workspace_files",
+}
+_cache_lock = threading.Lock()
+_tool_cache: TTLCache = TTLCache(maxsize=256, ttl=TOOL_CACHE_TTL)
+_file_cache: TTLCache = TTLCache(maxsize=64, ttl=FILE_CACHE_TTL)
+
+# One shared connection for the whole process. Paramiko transports are
+# thread-safe for exec_command, so the lock only guards (re)connecting.
+_lock = threading.Lock()
+_client: paramiko.SSHClient | None = None
+_sftp: paramiko.SFTPClient | None = None
+# SFTPClient matches replies to requests without any locking, so concurrent
+# callers could read each other's responses; each SFTP sequence holds this.
+_sftp_lock = threading.Lock()
+
+
+def _is_active(client: paramiko.SSHClient | None) -> bool:
+    if client is None:
+        return False
+    transport = client.get_transport()
+    return transport is not None and transport.is_active()
+
+
+def _get_or_open() -> paramiko.SSHClient:
+    """Return the pooled client, reconnecting only if the transport died."""
+    global _client
+    with _lock:
+        if _is_active(_client):
+            return _client
+
+        _close_locked()
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect(
+            hostname=SSH_HOST,
+            port=SSH_PORT,
+            username=SSH_USER,
+            key_filename=SSH_KEY_PATH,
+            timeout=15,
+        )
+        transport = client.get_transport()
+        transport.set_keepalive(SSH_KEEPALIVE)
+        transport.default_window_size = SSH_WINDOW_SIZE
+        transport.default_max_packet_size = SSH_MAX_PACKET_SIZE
+        _client = client
+        return client
+
+
+def _get_sftp() -> paramiko.SFTPClient:
+    """Return an SFTP subchannel on the pooled client, opened once per connection."""
+    global _sftp
+    client = _get_or_open()
+    with _lock:
+        if _sftp is None or _sftp.get_channel().closed:
+            _sftp = client.open_sftp()
+            # Ensure workdir exists; it almost always does already
+            try:
+                _sftp.mkdir(SSH_WORKDIR)
+            except IOError:
+                pass
+        return _sftp
+
+
+@contextmanager
+def _sftp_session():
+    """Exclusive use of the pooled SFTP client for one stat/get/put sequence."""
+    with _sftp_lock:
+        yield _get_sftp()
+
+
+def _close_locked() -> None:
+    global _client, _sftp
+    if _sftp is not None:
+        try:
+            _sftp.close()
+        except Exception:
+            pass
+        _sftp = None
+    if _client is not None:
+        try:
+            _client.close()
+        except Exception:
+            pass
+        _client = None
+
+
+def warm_up() -> None:
+    """Open the pooled connection ahead of the first tool call of a turn."""
+    try:
+        _get_or_open()
+    except Exception:
+        pass  # The tool call itself will report connection errors
+
+
+@atexit.register
+def close_pool() -> None:
+    """Close the pooled SSH connection (called automatically on shutdown)."""
+    with _lock:
+        _close_locked()
 
 
 def _run(cmd: str) -> tuple[str, str, int]:
-    """Run a command on the remote PC. Returns (stdout, stderr, exit_code)."""
-    client = _get_client()
+    """
+    Run a command on the remote PC. Returns (stdout, stderr, exit_code).
+    stderr is merged into stdout on one channel, so a command can't stall
+    on a full stderr pipe; when the command fails the combined output is
+    returned in the stderr slot.
+    """
+    chan = _get_or_open().get_transport().open_session()
     try:
-        stdin, stdout, stderr = client.exec_command(cmd, timeout=30)
-        out = stdout.read().decode("utf-8", errors="replace").strip()
-        err = stderr.read().decode("utf-8", errors="replace").strip()
-        code = stdout.channel.recv_exit_status()
-        return out, err, code
+        chan.settimeout(30)
+        chan.set_combine_stderr(True)
+        chan.exec_command(cmd)
+        out = b"".join(iter(lambda: chan.recv(65536), b""))
+        code = chan.recv_exit_status()
     finally:
-        client.close()
+        chan.close()
+    text = out.decode("utf-8", errors="replace").strip()
+    if code != 0:
+        return "", text, code
+    return text, "", code
+
+
+def _run_batch(cmds: dict[str, str]) -> dict[str, tuple[str, int]]:
+    """
+    Run several commands in one remote shell and split the output per key.
+    Returns {key: (stdout, exit_code)}; stderr is folded into each section.
+    """
+    # The marker starts with a newline so it lands on its own line even when
+    # the command's output doesn't end with one; $? is expanded before printf runs
+    script = "; ".join(
+        f"{{ {cmd}; }} 2>&1; printf '\\n%s\\n' \"{_BATCH_SEP}{key} $?\"" for key, cmd in cmds.items()
+    )
+    out, _err, _code = _run(script)
+
+    results: dict[str, tuple[str, int]] = {}
+    section: list[str] = []
+    for line in out.splitlines():
+        if line.startswith(_BATCH_SEP):
+            key, _, status = line[len(_BATCH_SEP):].rpartition(" ")
+            code = int(status) if status.isdigit() else 1
+            # Drop the blank line left by the marker's leading newline
+            if section and not section[-1]:
+                section.pop()
+            results[key] = ("\n".join(section).strip(), code)
+            section = []
+        else:
+            section.append(line)
+    return results
 
 
 def _safe_workdir_path(filename: str) -> str:
@@ -54,10 +200,16 @@ def _safe_workdir_path(filename: str) -> str:
 
 # ─── Tool implementations ──────────────────────────────────────────────────────
 
-def get_disk_free() -> str:
-    out, err, code = _run("df -h / | tail -1")
-    if code != 0:
-        return f"Error: {err}"
+DISK_CMD = "df -h / | tail -1"
+RAM_CMD = "free -h"
+CPU_CMD = (
+    "top -bn1 | grep 'Cpu(s)' | awk '{print $2+$4\"%\"}' || "
+    "cat /proc/loadavg"
+)
+UPTIME_CMD = "uptime -p && uptime"
+
+
+def _format_disk(out: str) -> str:
     parts = out.split()
     if len(parts) >= 5:
         return (
@@ -67,30 +219,56 @@ def get_disk_free() -> str:
     return out
 
 
+def get_disk_free() -> str:
+    out, err, code = _run(DISK_CMD)
+    if code != 0:
+        return f"Error: {err}"
+    return _format_disk(out)
+
+
 def get_ram_usage() -> str:
-    out, err, code = _run("free -h")
+    out, err, code = _run(RAM_CMD)
     if code != 0:
         return f"Error: {err}"
     return out
 
 
 def get_cpu_usage() -> str:
-    out, err, code = _run(
-        "top -bn1 | grep 'Cpu(s)' | awk '{print $2+$4\"%\"}' || "
-        "cat /proc/loadavg"
-    )
+    out, err, code = _run(CPU_CMD)
     if code != 0:
         return f"Error: {err}"
     return out or "Unable to read CPU usage."
 
 
 def get_uptime() -> str:
-    out, err, code = _run("uptime -p && uptime")
+    out, err, code = _run(UPTIME_CMD)
     if code != 0:
         out, err, code = _run("uptime")
     return out if out else f"Error: {err}"
 
 
+def get_system_snapshot() -> str:
+    """Disk, RAM, CPU and uptime fetched in a single remote invocation."""
+    results = _run_batch({
+        "disk": DISK_CMD,
+        "ram": RAM_CMD,
+        "cpu": CPU_CMD,
+        "uptime": UPTIME_CMD,
+    })
+
+    def section(key: str, title: str, fmt=lambda out: out) -> str:
+        out, code = results.get(key, ("", 1))
+        body = fmt(out) if code == 0 and out else f"Error: {out or 'no output'}"
+        return f"{title}:\n{body}"
+
+    return "\n\n".join([
+        section("disk", "Disk", _format_disk),
+        section("ram", "RAM"),
+        section("cpu", "CPU"),
+        section("uptime", "Uptime"),
+    ])
+
+
 def tail_nginx_error(lines: int = 50) -> str:
     lines = max(20, min(lines, 200))
     log_path = "/var/log/nginx/error.log"
@@ -133,23 +311,13 @@ def create_text_file(filename: str, content: str) -> str:
         return f"Error: {e}"
 
     # Use SFTP to write file safely (no shell injection risk)
-    client = _get_client()
     try:
-        sftp = client.open_sftp()
-        # Ensure workdir exists
-        try:
-            sftp.stat(SSH_WORKDIR)
-        except FileNotFoundError:
-            sftp.mkdir(SSH_WORKDIR)
-
-        with sftp.open(path, "w") as f:
-            f.write(content)
-        sftp.close()
+        with _sftp_session() as sftp:
+            sftp.putfo(io.BytesIO(content.encode("utf-8")), path)
+        _invalidate_file(path)
         return f"File '{filename}' created successfully in workspace."
     except Exception as e:
         return f"Error creating file: {e}"
-    finally:
-        client.close()
 
 
 def read_text_file(filename: str) -> str:
@@ -158,19 +326,25 @@ def read_text_file(filename: str) -> str:
     except ValueError as e:
         return f"Error: {e}"
 
-    client = _get_client()
     try:
-        sftp = client.open_sftp()
-        with sftp.open(path, "r") as f:
-            content = f.read().decode("utf-8", errors="replace")
-        sftp.close()
-        return content if content else "(File is empty)"
+        with _sftp_session() as sftp:
+            mtime = sftp.stat(path).st_mtime
+            with _cache_lock:
+                cached = _file_cache.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+
+            buf = io.BytesIO()
+            sftp.getfo(path, buf)
+        content = buf.getvalue().decode("utf-8", errors="replace")
+        result = content if content else "(File is empty)"
+        with _cache_lock:
+            _file_cache[path] = (mtime, result)
+        return result
     except FileNotFoundError:
         return f"File '{filename}' not found in workspace."
     except Exception as e:
         return f"Error reading file: {e}"
-    finally:
-        client.close()
 
 
 # ─── Dispatcher ───────────────────────────────────────────────────────────────
@@ -180,6 +354,7 @@ TOOL_MAP = {
     "get_ram_usage": lambda a: get_ram_usage(),
     "get_cpu_usage": lambda a: get_cpu_usage(),
     "get_uptime": lambda a: get_uptime(),
+    "get_system_snapshot": lambda a: get_system_snapshot(),
     "tail_nginx_error": lambda a: tail_nginx_error(a.get("lines", 50)),
     "tail_nginx_access": lambda a: tail_nginx_access(a.get("lines", 50)),
     "list_workspace_files": lambda a: list_workspace_files(),
@@ -188,13 +363,35 @@ TOOL_MAP = {
 }
 
 
+def _invalidate_file(path: str) -> None:
+    """Drop cached state that a workspace write makes stale."""
+    with _cache_lock:
+        _file_cache.pop(path, None)
+        for key in [k for k in _tool_cache if k[0] == "list_workspace_files"]:
+            _tool_cache.pop(key, None)
+
+
 def run_tool(action: dict) -> str:
     """Dispatch action to the correct tool function."""
     tool_name = action.get("action")
     fn = TOOL_MAP.get(tool_name)
     if fn is None:
         return f"Unknown tool: {tool_name}"
+
+    cacheable = tool_name in CACHED_TOOLS
+    if cacheable:
+        key = (tool_name, json.dumps(action, sort_keys=True))
+        with _cache_lock:
+            cached = _tool_cache.get(key)
+        if cached is not None:
+            return cached
+
     try:
-        return fn(action)
+        result = fn(action)
     except Exception as e:
         return f"Tool error ({tool_name}): {e}"
+
+    if cacheable and not result.startswith("Error"):
+        with _cache_lock:
+            _tool_cache[key] = result
+    return result
@@ -1,24 +1,33 @@
 import os
+import time
 import uuid
-import json
+import threading
+from typing import Iterator
 from datetime import datetime, timezone
 
 from flask import (
     Flask, render_template, request, jsonify,
     session, Response, stream_with_context
 )
+import orjson
 from dotenv import load_dotenv
 
 load_dotenv()
 
 from db import db, init_db
-from models import Conversation, Message, ToolRun, User
-from ollama_client import generate_title
-from agent.router import route
+from db_writer import start_writer, enqueue_message, enqueue_tool_run
+from models import Conversation, Message, User
+from ollama_client import chat, generate_title, keep_alive_seconds, LLM_POOL
+from agent.router import route, tokenize
 from agent.policy import check
-from agent.tools_ssh import run_tool
-from agent.formatters import format_tool_result, format_clarification, format_refusal
-from agent.memory import build_context, maybe_summarize
+from agent.tools_ssh import run_tool, warm_up
+from agent.formatters import (
+    format_tool_result, format_tool_result_stream, format_clarification, format_refusal
+)
+from agent.memory import (
+    build_context, maybe_summarize, CONTEXT_MESSAGES, SUMMARIZE_THRESHOLD,
+    SUMMARY_KEEP_RECENT, SUMMARY_INPUT_MESSAGES, SUMMARY_LINE_CHARS,
+)
 
 app = Flask(__name__)
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret-change-me")
@@ -28,8 +37,35 @@ os.makedirs(INSTANCE_DIR, exist_ok=True)
 default_db = f"sqlite:///{os.path.join(INSTANCE_DIR, 'ops_agent.db')}"
 app.config["SQLALCHEMY_DATABASE_URI"] = os.getenv("DATABASE_URL", default_db)
 app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
+# Room for many concurrent list/chat requests; connections are local or
+# long-lived, so skip the per-checkout ping and just recycle periodically.
+# SQLite allows one writer at a time and gives each connection its own page
+# cache (see db.py), so a small pool there is both enough and bounded in memory.
+_is_sqlite = app.config["SQLALCHEMY_DATABASE_URI"].startswith("sqlite")
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+    "pool_size": 5 if _is_sqlite else 20,
+    "max_overflow": 5 if _is_sqlite else 40,
+    "pool_recycle": 1800,
+    "pool_pre_ping": False,
+}
 
 init_db(app)
+start_writer(app)
+
+
+def keep_model_warm():
+    """Load the model at boot, then ping it so Ollama doesn't unload it while idle."""
+    keep_alive = keep_alive_seconds()
+    interval = min(keep_alive, 300) if keep_alive else 300
+    while True:
+        try:
+            chat([{"role": "user", "content": "ping"}], temperature=0, num_predict=1, use_cache=False)
+        except Exception:
+            pass
+        time.sleep(interval)
+
+
+threading.Thread(target=keep_model_warm, name="ollama-warmup", daemon=True).start()
 
 SESSION_HEADER = "X-Session-Id"
 USER_HEADER = "X-User-Token"
@@ -89,7 +125,8 @@ def register():
     if User.query.filter_by(email=email).first():
         return json_response({"error": "Email already registered."}, status=400, sid=sid)
 
-    user = User(email=email, auth_token=uuid.uuid4().hex)
+    user = User(email=email)
+    user.refresh_token()
     user.set_password(password)
     db.session.add(user)
     db.session.commit()
@@ -149,13 +186,12 @@ def list_conversations():
     user, err = authenticate_user()
     if err:
         return err
-    convs = (
-        Conversation.query
-        .filter_by(user_id=user.id)
-        .order_by(Conversation.updated_at.desc())
-        .all()
-    )
-    return json_response([c.to_dict() for c in convs], sid=sid, user_token=user.auth_token)
+    # Previews are opt-in (?preview=3) and then limited to the newest 20
+    # conversations; the sidebar only needs titles
+    preview = min(request.args.get("preview", 0, type=int), 10)
+    limit = request.args.get("limit", 20 if preview > 0 else None, type=int)
+    convs = Conversation.list_with_previews(user.id, limit=limit, preview=preview)
+    return json_response(convs, sid=sid, user_token=user.auth_token)
 
 
 @app.route("/api/conversations", methods=["POST"])
@@ -214,12 +250,47 @@ def delete_conversation(conv_id):
 
 # ─── Chat ─────────────────────────────────────────────────────────────────────
 
+def sse(payload) -> bytes:
+    """Encode one server-sent event frame."""
+    return b"data: " + orjson.dumps(payload) + b"\n\n"
+
+
+def word_chunks(text, size=5):
+    """Split already-complete text into small chunks for a smooth streaming feel."""
+    words = text.split(" ")
+    for i in range(0, len(words), size):
+        chunk = " ".join(words[i:i + size])
+        yield chunk + " " if i + size < len(words) else chunk
+
+
+def summarize_in_background(conv_id):
+    """Run maybe_summarize for a conversation with its own app context and session."""
+    with app.app_context():
+        conv = db.session.get(Conversation, conv_id)
+        if not conv:
+            return
+        # A count, then only the older rows the summarizer can use; never the full history
+        count = Message.query.filter_by(conversation_id=conv_id).count()
+        if count < SUMMARIZE_THRESHOLD:
+            return
+        older = (
+            db.session.query(Message.role, db.func.substr(Message.content, 1, SUMMARY_LINE_CHARS).label("content"))
+            .filter(Message.conversation_id == conv_id)
+            .order_by(Message.created_at.desc())
+            .offset(SUMMARY_KEEP_RECENT)
+            .limit(SUMMARY_INPUT_MESSAGES)
+            .all()
+        )
+        maybe_summarize(conv, count, older, db.session)
+
+
 @app.route("/api/chat", methods=["POST"])
 def chat_endpoint():
     sid = get_session_id()
     data = request.get_json()
     user_message = (data.get("message") or "").strip()
     conv_id = data.get("conversation_id")
+    stream = data.get("stream", True)
     user, err = authenticate_user()
     if err:
         return err
@@ -246,19 +317,22 @@ def chat_endpoint():
     db.session.flush()
     user_msg_id = user_msg.id
 
-    # Update title if first message
-    if Message.query.filter_by(conversation_id=conv.id, role="user").count() == 1:
-        try:
-            conv.title = generate_title(user_message)
-        except Exception:
-            conv.title = user_message[:60]
-
-    # Load message history for context
-    all_messages = Message.query.filter_by(conversation_id=conv.id).order_by(Message.created_at).all()
-    history = build_context(conv, all_messages)
+    # Generate a title for the first message while the tool runs
+    title_future = None
+    if conv.title == "New Chat":
+        title_future = LLM_POOL.submit(generate_title, user_message)
+
+    # Load only the recent messages the context window uses
+    recent_messages = (
+        Message.query
+        .filter_by(conversation_id=conv.id)
+        .order_by(Message.created_at.desc())
+        .limit(CONTEXT_MESSAGES)
+        .all()
+    )[::-1]
+    history = build_context(conv, recent_messages)
 
-    # Maybe summarize old messages and persist the conversation before the tool runs
-    maybe_summarize(conv, all_messages, db.session)
+    # Persist the conversation before the tool runs
     try:
         db.session.commit()
     except Exception:
@@ -267,18 +341,42 @@ def chat_endpoint():
     conv_id = conv.id
     conv_title = conv.title
 
-    def generate():
-        assistant_msg_id = None
-        assistant_created_at = None
+    # Summarizing old messages is best-effort and doesn't block this turn
+    LLM_POOL.submit(summarize_in_background, conv_id)
+    # Bring up the SSH connection while the router decides on a tool
+    LLM_POOL.submit(warm_up)
+
+    msg_lower = user_message.lower()
+
+    def resolve_title():
+        if title_future is None:
+            return conv_title
+        try:
+            return title_future.result()
+        except Exception:
+            return user_message[:60]
+
+    def save_reply(text: str) -> datetime:
+        # Written behind; the message id isn't known yet
+        created_at = enqueue_message(conv_id, "assistant", text)
+        Conversation.query.filter_by(id=conv_id).update({"updated_at": datetime.now(timezone.utc)})
+        db.session.commit()
+        return created_at
+
+    def generate() -> Iterator[bytes]:
+        reply_saved = False
         try:
             # Route the user message to a tool
-            action = route(user_message, history)
+            action = route(user_message, history, msg_lower)
 
             # Policy check
-            action = check(action, user_message)
+            action = check(action, user_message, msg_lower, tokenize(msg_lower))
 
             tool_name = action.get("action")
 
+            # Full reply text, unless it is streamed from the model
+            response_text = None
+
             # Handle meta-actions
             if tool_name == "ask_clarification":
                 response_text = format_clarification(action.get("question", "Could you clarify?"))
@@ -289,62 +387,68 @@ def chat_endpoint():
                 tool_output = run_tool(action)
 
                 # Log tool run
-                tool_run = ToolRun(
+                enqueue_tool_run(
                     conversation_id=conv_id,
                     message_id=user_msg_id,
                     tool_name=tool_name,
-                    input_json=json.dumps(action),
+                    input=action,
                     output_text=tool_output[:5000],
                     status="ok" if "Error" not in tool_output else "error",
                 )
-                db.session.add(tool_run)
-
-                # Format response
-                response_text = format_tool_result(tool_name, tool_output, user_message)
-
-            # Save assistant message
-            assistant_msg = Message(
-                conversation_id=conv_id,
-                role="assistant",
-                content=response_text,
-            )
-            db.session.add(assistant_msg)
-            db.session.flush()
-            assistant_msg_id = assistant_msg.id
-            assistant_created_at = assistant_msg.created_at
-            Conversation.query.filter_by(id=conv_id).update({"updated_at": datetime.utcnow()})
-            db.session.commit()
-
-            # Stream response as SSE
-            yield f"data: {json.dumps({'type': 'session', 'session_id': sid})}\n\n"
-            yield f"data: {json.dumps({'type': 'conv_id', 'conv_id': conv_id, 'title': conv_title})}\n\n"
-
-            # Stream text word by word for a smooth feel
-            words = response_text.split(" ")
-            chunk = ""
-            for i, word in enumerate(words):
-                chunk += word + " "
-                if (i + 1) % 5 == 0 or i == len(words) - 1:
-                    yield f"data: {json.dumps({'type': 'token', 'text': chunk})}\n\n"
-                    chunk = ""
-
-            yield f"data: {json.dumps({'type': 'done', 'message_id': assistant_msg_id, 'created_at': assistant_created_at.isoformat()})}\n\n"
+
+                # Format response, forwarding model tokens as they arrive
+                if stream:
+                    chunks = format_tool_result_stream(tool_name, tool_output, user_message)
+                else:
+                    response_text = format_tool_result(tool_name, tool_output, user_message)
+
+            # Save a generated title before streaming so a disconnect can't lose it.
+            # Existing titles aren't rewritten, which would undo a concurrent rename.
+            title = resolve_title()
+            if title_future is not None:
+                Conversation.query.filter_by(id=conv_id, title="New Chat").update({"title": title})
+                db.session.commit()
+
+            if response_text is not None:
+                assistant_created_at = save_reply(response_text)
+                reply_saved = True
+                chunks = word_chunks(response_text)
+
+            yield sse({'type': 'session', 'session_id': sid})
+            yield sse({'type': 'conv_id', 'conv_id': conv_id, 'title': title})
+
+            parts = []
+            finished = False
+            try:
+                for chunk in chunks:
+                    parts.append(chunk)
+                    yield sse({'type': 'token', 'text': chunk})
+                finished = True
+            finally:
+                # Also runs on client disconnect or a model error, keeping what
+                # was generated so far and marking it as incomplete
+                if not reply_saved:
+                    if not finished:
+                        parts.append("\n\n_(Response cut off.)_")
+                    assistant_created_at = save_reply("".join(parts))
+                    reply_saved = True
+
+            yield sse({'type': 'done', 'message_id': None, 'created_at': assistant_created_at.isoformat()})
 
         except RuntimeError as e:
             error_msg = str(e)
-            yield f"data: {json.dumps({'type': 'error', 'text': error_msg})}\n\n"
-            # Save error as assistant message
-            err_message = Message(
-                conversation_id=conv_id,
-                role="assistant",
-                content=f"⚠️ {error_msg}",
-            )
-            db.session.add(err_message)
-            db.session.commit()
+            yield sse({'type': 'error', 'text': error_msg})
+            # Save error as assistant message, unless a partial reply already was
+            if not reply_saved:
+                enqueue_message(conv_id, "assistant", f"⚠️ {error_msg}")
+            if title_future is not None:
+                Conversation.query.filter_by(id=conv_id, title="New Chat").update({"title": resolve_title()})
+                db.session.commit()
 
     resp = Response(
         stream_with_context(generate()),
         mimetype="text/event-stream",
+        direct_passthrough=True,
         headers={
             "Cache-Control": "no-cache",
             "X-Accel-Buffering": "no",
@@ -0,0 +1,99 @@
+"""
+Write-behind queue for chat records. Request threads enqueue rows and a
+single background thread commits them in small batches.
+"""
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from db import db
+from models import Message, ToolRun
+
+BATCH_SIZE = 100
+FLUSH_INTERVAL = 0.05  # seconds to wait for more rows before committing
+
+_queue: queue.Queue = queue.Queue(maxsize=1024)
+_start_lock = threading.Lock()
+_thread: threading.Thread | None = None
+
+
+def start_writer(app) -> None:
+    """Start the background writer thread for this app (idempotent)."""
+    global _thread
+    with _start_lock:
+        if _thread is not None and _thread.is_alive():
+            return
+        _thread = threading.Thread(target=_run, args=(app,), name="db-writer", daemon=True)
+        _thread.start()
+
+
+def enqueue_message(conversation_id: int, role: str, content: str) -> datetime:
+    """Queue a Message insert. Returns its created_at, stamped now so order is kept."""
+    created_at = datetime.now(timezone.utc)
+    _queue.put((Message, {
+        "conversation_id": conversation_id,
+        "role": role,
+        "content": content,
+        "created_at": created_at,
+    }))
+    return created_at
+
+
+def enqueue_tool_run(**fields) -> None:
+    """Queue a ToolRun insert."""
+    _queue.put((ToolRun, fields))
+
+
+def _next_batch() -> list:
+    batch = [_queue.get()]
+    deadline = time.monotonic() + FLUSH_INTERVAL
+    while len(batch) < BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.append(_queue.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _write(batch: list) -> None:
+    # Messages are plain rows, so they go in as one executemany; tool runs
+    # are few and go through the ORM for their input property
+    Message.bulk_create(db.session, [fields for model, fields in batch if model is Message])
+    db.session.add_all(model(**fields) for model, fields in batch if model is not Message)
+    db.session.commit()
+
+
+def _commit(batch: list) -> None:
+    try:
+        _write(batch)
+        return
+    except Exception:
+        db.session.rollback()
+    # One bad row shouldn't drop the rest of the batch
+    for item in batch:
+        try:
+            _write([item])
+        except Exception:
+            db.session.rollback()
+
+
+def _run(app) -> None:
+    while True:
+        batch = _next_batch()
+        with app.app_context():
+            _commit(batch)
+        for _ in batch:
+            _queue.task_done()
+
+
+@atexit.register
+def _drain(timeout: float = 5.0) -> None:
+    """Give queued rows a moment to reach the database on shutdown."""
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
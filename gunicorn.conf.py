@@ -0,0 +1,17 @@
+"""
+Gunicorn settings for production:
+
+    gunicorn -c gunicorn.conf.py app:app
+
+gevent workers let many SSE chat streams share one worker process instead
+of each holding a thread for the whole generation. The gevent worker
+monkey-patches the stdlib itself before the app is imported.
+"""
+import multiprocessing
+import os
+
+bind = os.getenv("BIND", "0.0.0.0:5000")
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "gevent"
+worker_connections = int(os.getenv("WORKER_CONNECTIONS", 1000))
+timeout = 120
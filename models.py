@@ -1,27 +1,41 @@
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
+import orjson
+from argon2 import PasswordHasher
+from argon2.exceptions import InvalidHashError, VerifyMismatchError
+from sqlalchemy import insert
+from sqlalchemy.dialects import mysql
+from sqlalchemy.orm import defer, deferred, raiseload
+from werkzeug.security import check_password_hash
 from db import db
-import uuid
+import secrets
 
 
 INDIA_TZ = ZoneInfo("Asia/Kolkata")
+_ph = PasswordHasher(time_cost=2, memory_cost=64 * 1024, parallelism=2)
 
 
-def _ensure_utc(dt: datetime):
-    if dt is None:
-        return None
-    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+# Asia/Kolkata has had a fixed +05:30 offset since 1945, so naive UTC values
+# can be shifted directly instead of going through a zoneinfo lookup.
+_IST_OFFSET = timedelta(hours=5, minutes=30)
+_IST = timezone(_IST_OFFSET)
 
 
-def _format_indian_time(dt: datetime):
-    ts = _ensure_utc(dt)
-    if ts is None:
+def _fast_ist(dt: datetime, _tz=INDIA_TZ, _ist=_IST, _offset=_IST_OFFSET):
+    # Called per row; default args make the tz lookups locals.
+    # SQLite returns naive datetimes, which are stored as UTC.
+    if dt is None:
         return None
-    return ts.astimezone(INDIA_TZ).isoformat()
+    if dt.tzinfo is None:
+        return (dt + _offset).replace(tzinfo=_ist).isoformat()
+    return dt.astimezone(_tz).isoformat()
 
 
 class Conversation(db.Model):
     __tablename__ = "conversations"
+    __table_args__ = (
+        db.Index("ix_conv_user_updated", "user_id", "updated_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     session_id = db.Column(db.String(64), nullable=False, index=True)
@@ -35,22 +49,87 @@ class Conversation(db.Model):
         onupdate=lambda: datetime.now(timezone.utc),
     )
 
-    messages = db.relationship("Message", backref="conversation", lazy=True, cascade="all, delete-orphan")
-    tool_runs = db.relationship("ToolRun", backref="conversation", lazy=True, cascade="all, delete-orphan")
+    # Loaded lazily: no code path walks these across many conversations, and
+    # eager loading would pull whole histories on every conversation fetch.
+    messages = db.relationship("Message", back_populates="conversation", lazy=True, cascade="all, delete-orphan")
+    tool_runs = db.relationship("ToolRun", back_populates="conversation", lazy=True, cascade="all, delete-orphan")
     user = db.relationship("User", back_populates="conversations")
 
     def to_dict(self):
         return {
             "id": self.id,
             "title": self.title,
-            "created_at": _format_indian_time(self.created_at),
-            "updated_at": _format_indian_time(self.updated_at),
+            "created_at": _fast_ist(self.created_at),
+            "updated_at": _fast_ist(self.updated_at),
             "user_id": self.user_id,
         }
 
+    @classmethod
+    def list_with_previews(
+        cls, user_id: int, limit: int | None = None, preview: int = 0, preview_chars: int = 120
+    ) -> list[dict]:
+        """
+        A user's conversations, newest first, serialized. With preview > 0
+        each also carries its last `preview` messages cut to `preview_chars`
+        characters, fetched in one windowed query over the listed
+        conversations; pass a limit then, as the window covers all their messages.
+        """
+        # to_dict() only needs columns; raiseload turns any accidental
+        # per-conversation relationship load (N+1) into an error
+        # The summary can be large and isn't part of the listing
+        query = (
+            cls.query
+            .options(raiseload("*"), defer(cls.summary))
+            .filter_by(user_id=user_id)
+            .order_by(cls.updated_at.desc())
+        )
+        if limit is not None:
+            query = query.limit(limit)
+        convs = query.all()
+        if preview <= 0:
+            return [c.to_dict() for c in convs]
+        if not convs:
+            return []
+
+        rank = db.func.row_number().over(
+            partition_by=Message.conversation_id,
+            order_by=Message.created_at.desc(),
+        ).label("rank")
+        ranked = (
+            db.select(
+                Message.id,
+                Message.conversation_id,
+                Message.role,
+                # Truncated in SQL so long log answers never leave the database
+                db.func.substr(Message.content, 1, preview_chars).label("content"),
+                Message.created_at,
+                rank,
+            )
+            .where(Message.conversation_id.in_([c.id for c in convs]))
+            .subquery()
+        )
+        rows = db.session.execute(
+            db.select(ranked)
+            .where(ranked.c.rank <= preview)
+            .order_by(ranked.c.conversation_id, ranked.c.created_at)
+        )
+
+        previews: dict[int, list[dict]] = {}
+        for row in rows:
+            previews.setdefault(row.conversation_id, []).append({
+                "id": row.id,
+                "role": row.role,
+                "content": row.content,
+                "created_at": _fast_ist(row.created_at),
+            })
+        return [{**c.to_dict(), "preview": previews.get(c.id, [])} for c in convs]
+
 
 class Message(db.Model):
     __tablename__ = "messages"
+    __table_args__ = (
+        db.Index("ix_messages_conv_created", "conversation_id", "created_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey("conversations.id"), nullable=False)
@@ -58,26 +137,48 @@ class Message(db.Model):
     content = db.Column(db.Text, nullable=False)
     created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
+    conversation = db.relationship("Conversation", back_populates="messages")
+
+    @classmethod
+    def bulk_create(cls, session, rows: list[dict]) -> None:
+        """Insert many messages with one executemany, bypassing the unit of work."""
+        if rows:
+            session.execute(insert(cls), rows)
+
     def to_dict(self):
         return {
             "id": self.id,
             "role": self.role,
             "content": self.content,
-            "created_at": _format_indian_time(self.created_at),
+            "created_at": _fast_ist(self.created_at),
         }
 
 
 class ToolRun(db.Model):
     __tablename__ = "tool_runs"
+    __table_args__ = (
+        db.Index("ix_tool_runs_conv_created", "conversation_id", "created_at"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     conversation_id = db.Column(db.Integer, db.ForeignKey("conversations.id"), nullable=False)
     message_id = db.Column(db.Integer, db.ForeignKey("messages.id"), nullable=True)
     tool_name = db.Column(db.String(100), nullable=False)
     input_json = db.Column(db.Text, nullable=True)
-    output_text = db.Column(db.Text, nullable=True)
+    output_text = deferred(db.Column(db.Text, nullable=True))  # audit log; loaded only on access
     status = db.Column(db.String(20), default="ok")  # ok / error
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    conversation = db.relationship("Conversation", back_populates="tool_runs")
+
+    @property
+    def input(self):
+        """The tool action dict, (de)serialized from input_json."""
+        return orjson.loads(self.input_json) if self.input_json else None
+
+    @input.setter
+    def input(self, value) -> None:
+        self.input_json = orjson.dumps(value).decode()
 
 
 class User(db.Model):
@@ -86,21 +187,37 @@ class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), nullable=False, unique=True, index=True)
     password_hash = db.Column(db.String(255), nullable=False)
-    auth_token = db.Column(db.String(64), nullable=False, unique=True, index=True)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Always 32 hex chars; on MySQL/MariaDB an ascii_bin CHAR makes index
+    # probes a plain byte comparison
+    auth_token = db.Column(
+        db.CHAR(32).with_variant(mysql.CHAR(32, charset="ascii", collation="ascii_bin"), "mysql", "mariadb"),
+        nullable=False,
+        unique=True,
+        index=True,
+    )
+    created_at = db.Column(db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
     conversations = db.relationship("Conversation", back_populates="user", lazy=True)
 
     def set_password(self, password: str) -> None:
-        from werkzeug.security import generate_password_hash
-
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = _ph.hash(password)
 
     def check_password(self, password: str) -> bool:
-        from werkzeug.security import check_password_hash
-
-        return check_password_hash(self.password_hash, password)
+        if not self.password_hash.startswith("$argon2"):
+            # Hash from before the argon2 switch; upgrade it on a successful login
+            if not check_password_hash(self.password_hash, password):
+                return False
+            self.set_password(password)
+            return True
+
+        try:
+            _ph.verify(self.password_hash, password)
+        except (VerifyMismatchError, InvalidHashError):
+            return False
+        if _ph.check_needs_rehash(self.password_hash):
+            self.set_password(password)
+        return True
 
     def refresh_token(self) -> str:
-        self.auth_token = uuid.uuid4().hex
+        self.auth_token = secrets.token_hex(16)
         return self.auth_token
@@ -1,39 +1,226 @@
 import os
-import json
-import requests
+import time
+import atexit
+import asyncio
+import threading
+from importlib.util import find_spec
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import blake2b
+import httpx
+import orjson
+from cachetools import LRUCache, TTLCache
 from dotenv import load_dotenv
 
 load_dotenv()
 
 OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL", "http://192.168.10.56:11434")
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "qwen2.5-coder:0.5b")
+# Optional; set to an embedding model (e.g. nomic-embed-text) to enable the semantic cache
+OLLAMA_EMBED_MODEL = os.getenv("OLLAMA_EMBED_MODEL", "")
+# How long Ollama keeps the model loaded after a request
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "24h")
 
+CHAT_PATH = "/api/chat"
+EMBEDDINGS_PATH = "/api/embeddings"
 
-def chat(messages: list, stream: bool = False, temperature: float = 0.1) -> str:
-    """Send messages to Ollama and return the response text."""
-    url = f"{OLLAMA_BASE_URL}/api/chat"
-    payload = {
-        "model": OLLAMA_MODEL,
-        "messages": messages,
-        "stream": stream,
-        "options": {"temperature": temperature},
-    }
+# Fixed parts of every chat request, built once
+_BASE_PAYLOAD = {"model": OLLAMA_MODEL, "stream": False, "keep_alive": OLLAMA_KEEP_ALIVE}
+_DEFAULT_OPTIONS = {"temperature": 0.1}
+
+# HTTP/2 is only negotiated over TLS (e.g. Ollama behind an HTTPS proxy) and
+# needs the optional h2 package; plain-http Ollama always speaks HTTP/1.1
+_HTTP2 = OLLAMA_BASE_URL.startswith("https://") and find_spec("h2") is not None
+
+# One client for the process so connections to Ollama are kept alive and reused.
+# The transport retries failed connects; _post retries gateway errors.
+_HTTP = httpx.Client(
+    base_url=OLLAMA_BASE_URL,
+    timeout=httpx.Timeout(60, connect=3),
+    transport=httpx.HTTPTransport(
+        http2=_HTTP2,
+        retries=2,
+        limits=httpx.Limits(max_connections=32, max_keepalive_connections=32),
+    ),
+)
+atexit.register(_HTTP.close)
+
+# Exact-prompt cache for chat(); keyed on a hash of model, options and messages
+CHAT_CACHE_MAX_TEMPERATURE = 0.3
+_chat_cache: TTLCache = TTLCache(maxsize=256, ttl=300)
+_chat_cache_lock = threading.Lock()
+
+_RETRY_STATUSES = {502, 503, 504}
+_RETRIES = 2
+_RETRY_BACKOFF = 0.2
+
+# Shared pool for LLM work that can run alongside the request (titles,
+# summaries). Ollama calls are I/O-bound, so size well past the CPU count.
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", (os.cpu_count() or 1) * 5))
+LLM_POOL = ThreadPoolExecutor(max_workers=LLM_POOL_SIZE, thread_name_prefix="llm")
+
+
+def _post(path: str, payload: dict, **kwargs) -> httpx.Response:
+    """POST to Ollama, retrying with backoff while a proxy reports it unavailable."""
+    for attempt in range(_RETRIES + 1):
+        response = _HTTP.post(path, json=payload, **kwargs)
+        if response.status_code not in _RETRY_STATUSES or attempt == _RETRIES:
+            return response
+        time.sleep(_RETRY_BACKOFF * 2 ** attempt)
+
+
+async def _apost(path: str, payload: dict, **kwargs) -> httpx.Response:
+    """
+    Async counterpart of _post. Async connections are tied to the event loop
+    that opened them, so each call uses its own client and closes it.
+    """
+    transport = httpx.AsyncHTTPTransport(http2=_HTTP2, retries=2)
+    async with httpx.AsyncClient(
+        base_url=OLLAMA_BASE_URL, timeout=httpx.Timeout(60, connect=3), transport=transport
+    ) as client:
+        for attempt in range(_RETRIES + 1):
+            response = await client.post(path, json=payload, **kwargs)
+            if response.status_code not in _RETRY_STATUSES or attempt == _RETRIES:
+                return response
+            await asyncio.sleep(_RETRY_BACKOFF * 2 ** attempt)
+
+
+def _chat_payload(messages: list, stream: bool, temperature: float, num_predict: int | None = None) -> dict:
+    if temperature == _DEFAULT_OPTIONS["temperature"] and num_predict is None:
+        options = _DEFAULT_OPTIONS
+    else:
+        options = {"temperature": temperature}
+        if num_predict is not None:
+            options["num_predict"] = num_predict
+    return {**_BASE_PAYLOAD, "messages": messages, "stream": stream, "options": options}
+
+
+def _iter_ndjson(response: httpx.Response):
+    """Yield records from a newline-delimited JSON response body."""
+    buf = bytearray()
+    for data in response.iter_bytes(chunk_size=8192):
+        buf += data
+        start = 0
+        while (end := buf.find(b"\n", start)) != -1:
+            if end > start:
+                yield orjson.loads(memoryview(buf)[start:end])
+            start = end + 1
+        del buf[:start]
+    if buf.strip():
+        yield orjson.loads(buf)
+
+
+def keep_alive_seconds() -> float | None:
+    """OLLAMA_KEEP_ALIVE in seconds ("30s", "5m", "24h" or a number); None if unbounded."""
+    value = OLLAMA_KEEP_ALIVE.strip().lower()
+    units = {"s": 1, "m": 60, "h": 3600}
     try:
-        response = requests.post(url, json=payload, timeout=60)
+        if value and value[-1] in units:
+            seconds = float(value[:-1]) * units[value[-1]]
+        else:
+            seconds = float(value)
+    except ValueError:
+        return None
+    return seconds if seconds >= 0 else None
+
+
+def _chat_cache_key(temperature: float, num_predict: int | None, messages: list) -> bytes:
+    return blake2b(
+        orjson.dumps((OLLAMA_MODEL, temperature, num_predict, messages), option=orjson.OPT_SORT_KEYS),
+        digest_size=16,
+    ).digest()
+
+
+def chat(
+    messages: list,
+    stream: bool = False,
+    temperature: float = 0.1,
+    num_predict: int | None = None,
+    use_cache: bool = True,
+) -> str:
+    """
+    Send messages to Ollama and return the response text.
+    num_predict caps the number of generated tokens.
+    Identical low-temperature, non-streaming prompts are answered from a
+    short-lived cache unless use_cache is False.
+    """
+    key = None
+    if use_cache and not stream and temperature <= CHAT_CACHE_MAX_TEMPERATURE:
+        key = _chat_cache_key(temperature, num_predict, messages)
+        with _chat_cache_lock:
+            cached = _chat_cache.get(key)
+        if cached is not None:
+            return cached
+
+    payload = _chat_payload(messages, stream, temperature, num_predict)
+    try:
+        response = _post(CHAT_PATH, payload)
         response.raise_for_status()
         if stream:
-            full = ""
-            for line in response.iter_lines():
-                if line:
-                    data = json.loads(line)
-                    chunk = data.get("message", {}).get("content", "")
-                    full += chunk
-                    if data.get("done"):
-                        break
-            return full
+            parts = []
+            for data in _iter_ndjson(response):
+                parts.append(data.get("message", {}).get("content", ""))
+                if data.get("done"):
+                    break
+            return "".join(parts)
         else:
-            return response.json()["message"]["content"]
-    except requests.exceptions.ConnectionError:
+            content = response.json()["message"]["content"]
+            if key is not None:
+                with _chat_cache_lock:
+                    _chat_cache[key] = content
+            return content
+    except httpx.ConnectError:
+        raise RuntimeError(
+            "Cannot connect to Ollama. Make sure Ollama is running at "
+            f"{OLLAMA_BASE_URL} and the model '{OLLAMA_MODEL}' is pulled."
+        )
+    except Exception as e:
+        raise RuntimeError(f"Ollama error: {e}")
+
+
+async def achat(messages: list, temperature: float = 0.1) -> str:
+    """
+    Async variant of chat() so callers on an event loop can run several
+    Ollama requests concurrently (e.g. with asyncio.gather). Shares chat()'s cache.
+    """
+    key = None
+    if temperature <= CHAT_CACHE_MAX_TEMPERATURE:
+        key = _chat_cache_key(temperature, None, messages)
+        with _chat_cache_lock:
+            cached = _chat_cache.get(key)
+        if cached is not None:
+            return cached
+
+    payload = _chat_payload(messages, False, temperature)
+    try:
+        response = await _apost(CHAT_PATH, payload)
+        response.raise_for_status()
+        content = response.json()["message"]["content"]
+        if key is not None:
+            with _chat_cache_lock:
+                _chat_cache[key] = content
+        return content
+    except httpx.ConnectError:
+        raise RuntimeError(
+            "Cannot connect to Ollama. Make sure Ollama is running at "
+            f"{OLLAMA_BASE_URL} and the model '{OLLAMA_MODEL}' is pulled."
+        )
+    except Exception as e:
+        raise RuntimeError(f"Ollama error: {e}")
+
+
+def chat_stream(messages: list, temperature: float = 0.1):
+    """Send messages to Ollama and yield response text chunks as they arrive."""
+    payload = _chat_payload(messages, True, temperature)
+    try:
+        with _HTTP.stream("POST", CHAT_PATH, json=payload) as response:
+            response.raise_for_status()
+            for data in _iter_ndjson(response):
+                chunk = data.get("message", {}).get("content", "")
+                if chunk:
+                    yield chunk
+                if data.get("done"):
+                    break
+    except httpx.ConnectError:
         raise RuntimeError(
             "Cannot connect to Ollama. Make sure Ollama is running at "
             f"{OLLAMA_BASE_URL} and the model '{OLLAMA_MODEL}' is pulled."
@@ -42,19 +229,69 @@ def chat(messages: list, stream: bool = False, temperature: float = 0.1) -> str:
         raise RuntimeError(f"Ollama error: {e}")
 
 
+def embed(text: str) -> list[float]:
+    """Return the embedding vector for text from Ollama's embeddings endpoint."""
+    payload = {"model": OLLAMA_EMBED_MODEL, "prompt": text, "keep_alive": OLLAMA_KEEP_ALIVE}
+    try:
+        response = _post(EMBEDDINGS_PATH, payload, timeout=30)
+        response.raise_for_status()
+        return response.json()["embedding"]
+    except Exception as e:
+        raise RuntimeError(f"Ollama embedding error: {e}")
+
+
+_TITLE_TEMPLATE = (
+    "Create a short (3-5 words) title for a chat that starts with: {!r}. "
+    "Output ONLY the title, no quotes, no extra text."
+)
+
+
+# Titles by normalized first message, shared by generate_title and
+# agenerate_title; failed calls aren't cached
+_title_cache: LRUCache = LRUCache(maxsize=1024)
+_title_cache_lock = threading.Lock()
+
+
+def _title_key(user_message: str) -> str:
+    # Repeated openers ("hi", "check disk") reuse the same title
+    return " ".join(user_message.lower().split())[:200]
+
+
+def _title_prompt(key: str) -> list[dict]:
+    return [{"role": "user", "content": _TITLE_TEMPLATE.format(key)}]
+
+
+def _store_title(key: str, raw: str) -> str:
+    title = raw.strip().strip("\"'")[:100]
+    with _title_cache_lock:
+        _title_cache[key] = title
+    return title
+
+
+def _lookup_title(key: str) -> str | None:
+    with _title_cache_lock:
+        return _title_cache.get(key)
+
+
 def generate_title(user_message: str) -> str:
     """Generate a short conversation title from the first user message."""
-    prompt = [
-        {
-            "role": "user",
-            "content": (
-                f"Create a short (3-5 words) title for a chat that starts with: '{user_message}'. "
-                "Output ONLY the title, no quotes, no extra text."
-            ),
-        }
-    ]
-    try:
-        title = chat(prompt, temperature=0.3).strip().strip('"').strip("'")
-        return title[:100] if title else user_message[:60]
-    except Exception:
-        return user_message[:60]
+    key = _title_key(user_message)
+    title = _lookup_title(key)
+    if title is None:
+        try:
+            title = _store_title(key, chat(_title_prompt(key), temperature=0.3))
+        except Exception:
+            return user_message[:60]
+    return title or user_message[:60]
+
+
+async def agenerate_title(user_message: str) -> str:
+    """Async variant of generate_title()."""
+    key = _title_key(user_message)
+    title = _lookup_title(key)
+    if title is None:
+        try:
+            title = _store_title(key, await achat(_title_prompt(key), temperature=0.3))
+        except Exception:
+            return user_message[:60]
+    return title or user_message[:60]